@@ -9,12 +9,35 @@ import time
 import inspect
 import subprocess
 import exceptions
+import errno
+import hashlib
+import shutil
+import socket
+import tarfile
+import tempfile
+import threading
+import types
+import urllib
+import httplib
+import Queue
+import BaseHTTPServer
+import SocketServer
+from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
 
 import pymutex
 
 DEFAULT_CACHE_ROOT = './.cachelog'
 DEFAULT_SCOPE = ''
+DEFAULT_REMOTE_STORE = None
 INDEX_NAME = 'cacheIndex'
+REMOTE_BATCH_SIZE = 64
+REMOTE_BATCH_BYTES = 64 << 20
+STREAM_CHUNK_SIZE = 1000
+PARTIAL_SUFFIX = '.partial'
+STALE_PARTIAL_AGE = 24 * 60 * 60
+WARM_BLOCK_SIZE = 1 << 20
+TRANSFER_BLOCK_SIZE = 1 << 20
 
 VERSION = 0.1
 
@@ -51,6 +74,20 @@ def set_cache_root(cache_root):
     global DEFAULT_CACHE_ROOT
     DEFAULT_CACHE_ROOT = cache_root
 
+def set_remote_store(remote_store):
+    '''sets the RemoteStore shared between machines.
+    Set to None to only use the local cache.'''
+    global DEFAULT_REMOTE_STORE
+    DEFAULT_REMOTE_STORE = remote_store
+
+def remove_if_present(path):
+    '''deletes a file, ignoring it if it is already gone'''
+    try:
+        os.remove(path)
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            raise
+
 def touch_path(scope, cache_root):
     '''creates directories for given scope'''
     try:
@@ -266,6 +303,31 @@ def write_entry_to_index(function, arguments, metadata, timestamp, cache_file, s
     write_index(index, scope, cache_root)
     unlock_index(scope, cache_root)
 
+def remove_stale_partial_files(max_age=STALE_PARTIAL_AGE, scope=None, cache_root=None):
+    '''
+    deletes partially written cache files that haven't been written to for max_age
+    seconds. These are left behind when a process is killed while streaming results.
+    Returns the names of the deleted files.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+
+    path = os.path.join(cache_root, scope)
+    cutoff = time.time() - max_age
+    removed_files = []
+    for file_name in os.listdir(path):
+        if not file_name.endswith(PARTIAL_SUFFIX):
+            continue
+        try:
+            if os.path.getmtime(os.path.join(path, file_name)) < cutoff:
+                os.remove(os.path.join(path, file_name))
+                removed_files.append(file_name)
+        except OSError:
+            pass
+    return removed_files
+
 def rebuild_index(scope, cache_root):
     '''
     scans files in a directory to recover the index in case the index is
@@ -277,13 +339,18 @@ def rebuild_index(scope, cache_root):
     'cache_file' is the file to return on a cache hit
     'timestamp' is the time of cache_file was created.
     See 'add_to_index' function for a codified description of this.
+
+    stale partially written files are deleted.
     '''
+    remove_stale_partial_files(scope=scope, cache_root=cache_root)
     path = os.path.join(cache_root, scope)
     file_names = [f for f in os.listdir(path) if \
             os.path.isfile(os.path.join(path, f))]
 
     index = {}
     for file_name in file_names:
+        if file_name.endswith(PARTIAL_SUFFIX):
+            continue
         try:
             file_pointer = open(os.path.join(path, file_name))
             cache_data = pickle.load(file_pointer)
@@ -300,18 +367,249 @@ def rebuild_index(scope, cache_root):
             pass
     write_index(index, scope, cache_root)
 
+def merge_indices(index, other_index):
+    '''
+    adds every entry of other_index to index without reading any cache files.
+    Entries present in both are kept once, and each cache key keeps its newest cache hit.
+    CAREFUL: THIS FUNCTION MODIFIES THE SUPPLIED INDEX DICTIONARY
+    '''
+    cachelist = index.setdefault('cachelist', {})
+    for cache_key in other_index:
+        if cache_key == 'cachelist':
+            continue
+        other_entry = other_index[cache_key]
+        if cache_key not in index:
+            index[cache_key] = blank_index_entry()
+        entry = index[cache_key]
+
+        known_files = set([logfile['cache_file'] for logfile in entry['logfiles']])
+        for logfile in other_entry['logfiles']:
+            if logfile['cache_file'] in known_files:
+                continue
+            entry['logfiles'].append(logfile)
+            cachelist.setdefault(logfile['function'], []).append(logfile)
+
+        if other_entry['cache_file'] is not None and entry['cacheTime'] < other_entry['cacheTime']:
+            entry['cache_file'] = other_entry['cache_file']
+            entry['cacheTime'] = other_entry['cacheTime']
+
+def merge_into_index(other_index, scope, cache_root):
+    '''merges other_index into the index of a scope, taking care of necessary locking.'''
+    lock_index(scope, cache_root)
+    index = load_index(scope, cache_root)
+    merge_indices(index, other_index)
+    write_index(index, scope, cache_root)
+    unlock_index(scope, cache_root)
+
+def get_indexed_files(index):
+    '''returns the names of all cache files listed in an index'''
+    return set([logfile['cache_file'] for cache_key in index if cache_key != 'cachelist' \
+        for logfile in index[cache_key]['logfiles']])
+
+def filter_index(index, cache_files):
+    '''returns a copy of index holding only the entries whose cache file is in cache_files'''
+    filtered_index = empty_index()
+    for cache_key in index:
+        if cache_key == 'cachelist':
+            continue
+        entry = index[cache_key]
+        logfiles = [logfile for logfile in entry['logfiles'] if logfile['cache_file'] in cache_files]
+        if len(logfiles) == 0:
+            continue
+        filtered_entry = blank_index_entry()
+        filtered_entry['logfiles'] = logfiles
+        if entry['cache_file'] in cache_files:
+            filtered_entry['cache_file'] = entry['cache_file']
+            filtered_entry['cacheTime'] = entry['cacheTime']
+        filtered_index[cache_key] = filtered_entry
+        for logfile in logfiles:
+            filtered_index['cachelist'].setdefault(logfile['function'], []).append(logfile)
+    return filtered_index
+
+def copy_index(scope, cache_root):
+    '''loads a copy of the index of a scope, taking care of necessary locking.'''
+    lock_index(scope, cache_root)
+    index = load_index(scope, cache_root)
+    unlock_index(scope, cache_root)
+    return index
+
+def merge_scopes(source_scope, dest_scope, source_cache_root=None, dest_cache_root=None):
+    '''
+    copies every entry of source_scope into dest_scope, keeping the entries
+    already in dest_scope. Cache files are hard-linked when possible and the
+    indices are merged directly, so no cache files are read.
+    '''
+    if source_cache_root is None:
+        source_cache_root = DEFAULT_CACHE_ROOT
+    if dest_cache_root is None:
+        dest_cache_root = source_cache_root
+
+    touch_path(dest_scope, dest_cache_root)
+    source_index = copy_index(source_scope, source_cache_root)
+    merged_files = set()
+    for cache_file in get_indexed_files(source_index):
+        source_path = os.path.join(source_cache_root, source_scope, cache_file)
+        dest_path = os.path.join(dest_cache_root, dest_scope, cache_file)
+        if os.path.isfile(dest_path):
+            merged_files.add(cache_file)
+            continue
+        if not os.path.isfile(source_path):
+            continue
+        try:
+            os.link(source_path, dest_path)
+        except OSError:
+            if not os.path.isfile(dest_path):
+                shutil.copyfile(source_path, dest_path)
+        merged_files.add(cache_file)
+    # entries whose cache files have been deleted are left out of the merge
+    merge_into_index(filter_index(source_index, merged_files), dest_scope, dest_cache_root)
+
+def export_scope(archive_path, scope=None, cache_root=None):
+    '''
+    packs a scope into a single tar archive at archive_path.
+    The archive holds the cache files and a ready-to-use copy of the index,
+    so import_scope doesn't need to rebuild it.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+
+    index = copy_index(scope, cache_root)
+    archive = tarfile.open(archive_path, 'w')
+    archived_files = set()
+    for cache_file in sorted(get_indexed_files(index)):
+        path = os.path.join(cache_root, scope, cache_file)
+        if os.path.isfile(path):
+            archive.add(path, arcname=cache_file)
+            archived_files.add(cache_file)
+    # entries whose cache files have been deleted are left out of the archived index
+    index_data = pickle.dumps(filter_index(index, archived_files))
+    index_info = tarfile.TarInfo(INDEX_NAME)
+    index_info.size = len(index_data)
+    index_info.mtime = time.time()
+    archive.addfile(index_info, StringIO(index_data))
+    archive.close()
+
+def import_scope(archive_path, scope=None, cache_root=None):
+    '''
+    unpacks an archive made by export_scope into a scope.
+    Entries already in the scope are kept and the embedded index is merged
+    into the scope's index.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+
+    touch_path(scope, cache_root)
+    path = os.path.join(cache_root, scope)
+    archive = tarfile.open(archive_path, 'r')
+    try:
+        try:
+            archived_index = pickle.load(archive.extractfile(INDEX_NAME))
+        except KeyError:
+            raise ValueError('archive ' + archive_path + ' has no ' + INDEX_NAME)
+
+        # files already in the scope may be being read, so they are left alone and
+        # new files are extracted under a temporary name and renamed into place
+        for member in archive:
+            if not member.isfile() or os.path.basename(member.name) != member.name or \
+                    member.name == INDEX_NAME:
+                continue
+            if os.path.isfile(os.path.join(path, member.name)):
+                continue
+            file_descriptor, partial_path = tempfile.mkstemp(dir=path, suffix=PARTIAL_SUFFIX)
+            try:
+                file_pointer = os.fdopen(file_descriptor, 'wb')
+                shutil.copyfileobj(archive.extractfile(member), file_pointer)
+                file_pointer.close()
+                os.rename(partial_path, os.path.join(path, member.name))
+            except:
+                remove_if_present(partial_path)
+                raise
+    finally:
+        archive.close()
+
+    merge_into_index(archived_index, scope, cache_root)
+
+def read_file_into_page_cache(path):
+    '''reads and discards a file so that later reads are served from the page cache.
+    Returns the number of bytes read.'''
+    try:
+        file_pointer = open(path, 'rb')
+    except IOError:
+        return 0
+    num_bytes = 0
+    block = file_pointer.read(WARM_BLOCK_SIZE)
+    while block:
+        num_bytes += len(block)
+        block = file_pointer.read(WARM_BLOCK_SIZE)
+    file_pointer.close()
+    return num_bytes
+
+def warm_scope(functions=(), cache_keys=(), scope=None, cache_root=None, num_threads=8):
+    '''
+    preloads a scope into the page cache so that the first lookups on a new
+    worker don't pay for cold disk reads.
+    The index is always loaded. All logged results of each of functions (function
+    objects or names) and the cached result of each of cache_keys (see get_cache_key)
+    are read using num_threads parallel readers.
+    Returns the number of bytes of results read.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+
+    index = copy_index(scope, cache_root)
+
+    cache_files = set()
+    for function in functions:
+        for logfile in index['cachelist'].get(get_func_name(function), []):
+            cache_files.add(logfile['cache_file'])
+    for cache_key in cache_keys:
+        if cache_key in index and index[cache_key]['cache_file'] is not None:
+            cache_files.add(index[cache_key]['cache_file'])
+
+    paths = [os.path.join(cache_root, scope, cache_file) for cache_file in cache_files]
+    pool = ThreadPool(num_threads)
+    try:
+        num_bytes = sum(pool.map(read_file_into_page_cache, paths))
+    finally:
+        pool.close()
+        pool.join()
+    return num_bytes
+
 def get_results_from_cache_file(cache_file, scope=None, cache_root=None):
-    '''extracts function output from cached data'''
+    '''extracts function output from cached data.
+    Streamed results are returned as an iterator that can only be read once.'''
     if cache_root is None:
         cache_root = DEFAULT_CACHE_ROOT
     if scope is None:
         scope = DEFAULT_SCOPE
     path = os.path.join(cache_root, scope, cache_file)
-    file_pointer = open(path)
+    file_pointer = open(path, 'rb')
     cache_data = pickle.load(file_pointer)
+    if cache_data.get('is_stream', False):
+        return iterate_stream_file(file_pointer)
     file_pointer.close()
     return cache_data['results']
 
+def iterate_stream_file(file_pointer):
+    '''lazily yields the items of a streamed cache file one chunk at a time.
+    file_pointer should be positioned just after the header.'''
+    try:
+        while True:
+            try:
+                chunk = pickle.load(file_pointer)
+            except EOFError:
+                break
+            for item in chunk:
+                yield item
+    finally:
+        file_pointer.close()
+
 def write_data_to_cache_file(cache_data, cache_file, scope, cache_root):
     '''writes function output to a given cache file.'''
     path = os.path.join(cache_root, scope, cache_file)
@@ -319,6 +617,173 @@ def write_data_to_cache_file(cache_data, cache_file, scope, cache_root):
     pickle.dump(cache_data, file_pointer)
     file_pointer.close()
 
+def get_remote_key(name, scope):
+    '''converts a cache key or cache file name into a key in the remote store'''
+    return scope + '/' + name
+
+def split_into_batches(items):
+    '''
+    splits a dict of key/blob pairs into dicts of at most REMOTE_BATCH_SIZE pairs
+    and REMOTE_BATCH_BYTES bytes of blobs. A blob larger than REMOTE_BATCH_BYTES
+    gets a batch of its own.
+    '''
+    batch = {}
+    batch_bytes = 0
+    for key in items:
+        blob_bytes = len(items[key])
+        if len(batch) > 0 and (len(batch) >= REMOTE_BATCH_SIZE or \
+                batch_bytes + blob_bytes > REMOTE_BATCH_BYTES):
+            yield batch
+            batch = {}
+            batch_bytes = 0
+        batch[key] = items[key]
+        batch_bytes += blob_bytes
+    if len(batch) > 0:
+        yield batch
+
+def push_to_remote_store(cache_key, cache_file, timestamp, setcache_flag, scope, cache_root):
+    '''
+    write-through: copies a newly written cache file to the remote store.
+    If setcache_flag is true, the cache key is then pointed at the new file so that
+    other machines can use it as a cache hit, unless the remote store already
+    points it at a newer file.
+    Failures to reach the remote store are ignored: the local cache is still valid.
+    '''
+    remote_store = DEFAULT_REMOTE_STORE
+    if remote_store is None:
+        return
+    file_pointer = open(os.path.join(cache_root, scope, cache_file), 'rb')
+    try:
+        remote_store.put_file(get_remote_key(cache_file, scope), file_pointer)
+        if setcache_flag:
+            remote_store.put_newest({get_remote_key(cache_key, scope): (timestamp, cache_file)})
+    except IOError:
+        pass
+    finally:
+        file_pointer.close()
+
+def read_cache_entry(path):
+    '''
+    reads the function name, arguments, metadata and timestamp stored at the start
+    of a cache file. Returns None if the file is truncated or corrupt.
+    '''
+    try:
+        file_pointer = open(path, 'rb')
+        try:
+            cache_data = pickle.load(file_pointer)
+        finally:
+            file_pointer.close()
+        return (cache_data['function'], cache_data['arguments'], cache_data['metadata'], \
+            cache_data['timestamp'])
+    except Exception:
+        return None
+
+def pull_from_remote_store(function, arguments, scope, cache_root):
+    '''
+    read-through: looks for a cached result of function(arguments) in the remote store.
+    A remote hit is copied to local disk and added to the local index so that
+    later hits are served locally.
+    Returns the name of the local cache file, or None if there is no remote hit.
+    '''
+    remote_store = DEFAULT_REMOTE_STORE
+    if remote_store is None:
+        return None
+    try:
+        cache_file = remote_store.get(get_remote_key(get_cache_key(function, arguments), scope))
+    except IOError:
+        return None
+    if cache_file is None:
+        return None
+
+    # the file is downloaded under a unique temporary name so a failed transfer is never
+    # a cache hit and processes pulling the same file don't overwrite each other
+    path = os.path.join(cache_root, scope, cache_file)
+    file_descriptor, partial_path = tempfile.mkstemp(dir=os.path.join(cache_root, scope), \
+        suffix=PARTIAL_SUFFIX)
+    file_pointer = os.fdopen(file_descriptor, 'wb')
+    try:
+        found = remote_store.get_file(get_remote_key(cache_file, scope), file_pointer)
+    except IOError:
+        found = False
+    finally:
+        file_pointer.close()
+
+    # a truncated or corrupt file is treated as a miss
+    entry = None
+    if found:
+        entry = read_cache_entry(partial_path)
+    if entry is None:
+        remove_if_present(partial_path)
+        return None
+
+    # linking fails if another process has already put the file in place;
+    # that process indexes it, so it is a hit that isn't indexed again
+    try:
+        os.link(partial_path, path)
+    except OSError as error:
+        remove_if_present(partial_path)
+        if error.errno == errno.EEXIST:
+            return cache_file
+        raise
+    remove_if_present(partial_path)
+    function_name, arguments, metadata, timestamp = entry
+    write_entry_to_index(function_name, arguments, metadata, timestamp, cache_file, True, \
+        scope, cache_root)
+    return cache_file
+
+def push_scope(scope=None, cache_root=None):
+    '''
+    uploads every entry of a local scope to the remote store, e.g. to seed a shared
+    cache from an existing one. Entries are sent in batches of at most REMOTE_BATCH_SIZE
+    entries and REMOTE_BATCH_BYTES bytes; larger files are streamed on their own.
+    Cache keys that already point at newer results in the remote store are left alone.
+    Raises ValueError if no remote store has been set.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+    remote_store = DEFAULT_REMOTE_STORE
+    if remote_store is None:
+        raise ValueError('no remote store to push to: call set_remote_store first')
+
+    lock_index(scope, cache_root)
+    index = load_index(scope, cache_root)
+    unlock_index(scope, cache_root)
+
+    # cache files are sent before the cache keys pointing at them
+    items = {}
+    items_bytes = 0
+    pointers = {}
+    for cache_key in index:
+        if cache_key == 'cachelist':
+            continue
+        entry = index[cache_key]
+        for logfile in entry['logfiles']:
+            path = os.path.join(cache_root, scope, logfile['cache_file'])
+            if not os.path.isfile(path):
+                continue
+            file_pointer = open(path, 'rb')
+            if os.path.getsize(path) > REMOTE_BATCH_BYTES:
+                remote_store.put_file(get_remote_key(logfile['cache_file'], scope), file_pointer)
+                file_pointer.close()
+                continue
+            blob = file_pointer.read()
+            file_pointer.close()
+            items[get_remote_key(logfile['cache_file'], scope)] = blob
+            items_bytes += len(blob)
+            if len(items) >= REMOTE_BATCH_SIZE or items_bytes >= REMOTE_BATCH_BYTES:
+                remote_store.put_many(items)
+                items = {}
+                items_bytes = 0
+        if entry['cache_file'] is not None and \
+                os.path.isfile(os.path.join(cache_root, scope, entry['cache_file'])):
+            pointers[get_remote_key(cache_key, scope)] = (entry['cacheTime'], entry['cache_file'])
+    if len(items) > 0:
+        remote_store.put_many(items)
+    if len(pointers) > 0:
+        remote_store.put_newest(pointers)
+
 def cache_function(function, arguments, metadata=None, scope=None, cache_root=None):
     '''
     caches the results of running a function with keyword arguments specified
@@ -335,6 +800,8 @@ def cache_function(function, arguments, metadata=None, scope=None, cache_root=No
     touch_path(scope, cache_root)
 
     cache_file = get_cache_file(function, arguments, scope, cache_root)
+    if cache_file is None:
+        cache_file = pull_from_remote_store(function, arguments, scope, cache_root)
     if cache_file != None:
         return get_results_from_cache_file(cache_file, scope, cache_root)
 
@@ -396,8 +863,103 @@ def log_function(function, arguments, metadata=None, use_as_cache=True, scope=No
     write_data_to_cache_file(cache_data, cache_file, scope, cache_root)
     write_entry_to_index(function, arguments, metadata, timestamp, cache_file, use_as_cache, \
         scope, cache_root)
+    push_to_remote_store(cache_key, cache_file, timestamp, use_as_cache, scope, cache_root)
     return cache_data['results']
 
+def write_stream_to_cache_file(results, cache_data, cache_file, chunk_size, scope, cache_root):
+    '''
+    yields the items of results while writing them to a cache file in chunks of
+    chunk_size items. The file is written under a temporary name and only renamed
+    and added to the index once results is exhausted, so an interrupted run
+    never leaves behind a cache hit.
+    '''
+    path = os.path.join(cache_root, scope, cache_file)
+    partial_path = path + PARTIAL_SUFFIX
+    file_pointer = open(partial_path, 'wb')
+    complete = False
+    try:
+        pickle.dump(cache_data, file_pointer, pickle.HIGHEST_PROTOCOL)
+        chunk = []
+        for item in results:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                pickle.dump(chunk, file_pointer, pickle.HIGHEST_PROTOCOL)
+                chunk = []
+            yield item
+        if len(chunk) > 0:
+            pickle.dump(chunk, file_pointer, pickle.HIGHEST_PROTOCOL)
+        file_pointer.close()
+        os.rename(partial_path, path)
+        complete = True
+    finally:
+        if not complete:
+            file_pointer.close()
+            os.remove(partial_path)
+
+    write_entry_to_index(cache_data['function'], cache_data['arguments'], cache_data['metadata'], \
+        cache_data['timestamp'], cache_file, cache_data['is_cache_hit'], scope, cache_root)
+    push_to_remote_store(cache_data['cache_key'], cache_file, cache_data['timestamp'], \
+        cache_data['is_cache_hit'], scope, cache_root)
+
+def log_stream(function, arguments, metadata=None, use_as_cache=True, scope=None, cache_root=None, \
+        chunk_size=None):
+    '''
+    streaming version of log_function for functions that return a generator
+    or other iterable too large to hold in memory.
+    Returns an iterator over the function's results that writes them to the cache
+    in chunks of chunk_size items as they are consumed. The results are only stored
+    once the iterator is exhausted.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_SIZE
+
+    touch_path(scope, cache_root)
+
+    unprocessed_args = arguments
+    arguments = process_arguments(arguments)
+
+    cache_data = {}
+    cache_data['cache_key'] = get_cache_key(function, arguments)
+    cache_data['is_cache_hit'] = use_as_cache
+    cache_data['is_stream'] = True
+    cache_data['function'] = function.__name__
+    cache_data['arguments'] = arguments
+    results = function(**unprocessed_args)
+    timestamp = get_timestamp()
+    cache_data['timestamp'] = timestamp
+    cache_data['metadata'] = metadata
+    cache_data['cachelogversion'] = VERSION
+
+    cache_file = get_cachefile_name(function, arguments, timestamp)
+
+    return write_stream_to_cache_file(results, cache_data, cache_file, chunk_size, \
+        scope, cache_root)
+
+def cache_stream(function, arguments, metadata=None, scope=None, cache_root=None, chunk_size=None):
+    '''
+    streaming version of cache_function. On a cache hit, returns an iterator
+    that reads the cached results from disk one chunk at a time.
+    Otherwise, behaves like log_stream.
+    '''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+
+    touch_path(scope, cache_root)
+
+    cache_file = get_cache_file(function, arguments, scope, cache_root)
+    if cache_file is None:
+        cache_file = pull_from_remote_store(function, arguments, scope, cache_root)
+    if cache_file != None:
+        return get_results_from_cache_file(cache_file, scope, cache_root)
+
+    return log_stream(function, arguments, metadata, True, scope, cache_root, chunk_size)
+
 def cachify(function, scope=None, cache_root=None):
     '''returns a wrapped version of a supplied function
     that will check for and return a cached result when called
@@ -442,6 +1004,28 @@ def logify(function, use_as_cache=True, scope=None, cache_root=None):
 
     return logified_function
 
+def streamify(function, scope=None, cache_root=None, chunk_size=None):
+    '''returns a wrapped version of a supplied generator function
+    that will stream its results from the cache when called
+    and stream them into the cache if no cached result is available.'''
+    if cache_root is None:
+        cache_root = DEFAULT_CACHE_ROOT
+    if scope is None:
+        scope = DEFAULT_SCOPE
+
+    args_list = inspect.getargspec(function).args
+    def streamified_function(*args, **kwargs):
+        '''streamified version of a function'''
+        args_dict = dict(zip(args_list, args))
+        args_dict.update(kwargs)
+        return cache_stream(function, args_dict, scope=scope, cache_root=cache_root, \
+            chunk_size=chunk_size)
+    if function.__doc__:
+        streamified_function.__doc__ = function.__doc__ + '\n**** streamified ****'
+    streamified_function.__name__ = function.__name__
+
+    return streamified_function
+
 def get_save_func(data):
     '''returns a function that can be used with the cache machinery
     to save some arbitrary data'''
@@ -464,7 +1048,8 @@ def save(data, title, metadata=None, scope=None, cache_root=None):
     log_function(save_func, arguments, metadata, False, scope, cache_root)
 
 def get(title, filter_func=lambda x: x, scope=None, cache_root=None):
-    '''finds all data stored under a given title, filtering the results using filter_func'''
+    '''finds all data stored under a given title, filtering the results using filter_func.
+    Results come from get_results_from_cache_file, so streamed results are one-shot iterators.'''
 
     if cache_root is None:
         cache_root = DEFAULT_CACHE_ROOT
@@ -500,14 +1085,20 @@ def process_logged_function_calls(function, processor=lambda x: x, filter_func=l
     [process(return_val) for return_val returned from function if filter_func(return_val)]
     
     This is accomplished without loading all the return_vals into memory
-    simultaneously.'''
+    simultaneously. Streamed return_vals are read once by filter_func and
+    again by processor.'''
 
     logged_calls = get_logged_calls(function, scope, cache_root)
     processed_calls = []
     for logged_call in logged_calls:
-        results = get_results_from_cache_file(logged_call['cache_file'])
+        results = get_results_from_cache_file(logged_call['cache_file'], scope, cache_root)
         if filter_func(results):
+            if isinstance(results, types.GeneratorType):
+                results.close()
+                results = get_results_from_cache_file(logged_call['cache_file'], scope, cache_root)
             processed_calls.append(processor(results))
+        elif isinstance(results, types.GeneratorType):
+            results.close()
 
     return processed_calls
 
@@ -530,7 +1121,300 @@ def recover_logged_value(function, arguments, scope=None, cache_root=None):
     touch_path(scope, cache_root)
 
     cache_file = get_cache_file(function, arguments, scope, cache_root)
+    if cache_file is None:
+        cache_file = pull_from_remote_store(function, arguments, scope, cache_root)
     if cache_file is None:
         raise exceptions.ValueError
     else:
         return get_results_from_cache_file(cache_file, scope, cache_root)
+
+class RemoteStore(object):
+    '''
+    interface for a key/blob service that holds cache files shared between machines.
+    Install one with set_remote_store.
+
+    Subclasses must implement get_many, put_many and put_newest. Blobs are byte strings.
+    These should raise IOError if the service can't be reached, in which case
+    cachelog falls back to the local cache.
+    '''
+
+    def get_many(self, keys):
+        '''returns a dict mapping each key in keys that is present in the store to its blob'''
+        raise NotImplementedError
+
+    def put_many(self, items):
+        '''stores every key/blob pair in the dict items'''
+        raise NotImplementedError
+
+    def put_newest(self, items):
+        '''
+        items maps keys to (timestamp, blob) pairs. Each blob is stored under its key
+        unless the store already holds a blob for that key with a newer timestamp.
+        This is used for pointers from cache keys to cache files, so that a slow
+        writer can't replace a newer result with an older one.
+        '''
+        raise NotImplementedError
+
+    def get(self, key):
+        '''returns the blob stored under key, or None if there is none'''
+        return self.get_many([key]).get(key)
+
+    def put(self, key, blob):
+        '''stores blob under key'''
+        self.put_many({key: blob})
+
+    def get_file(self, key, file_pointer):
+        '''writes the blob stored under key to an open file.
+        Returns False if there is none.
+        Override this to avoid holding large blobs in memory.'''
+        blob = self.get(key)
+        if blob is None:
+            return False
+        file_pointer.write(blob)
+        return True
+
+    def put_file(self, key, file_pointer):
+        '''stores the contents of an open file under key.
+        Override this to avoid holding large blobs in memory.'''
+        self.put(key, file_pointer.read())
+
+class HTTPRemoteStore(RemoteStore):
+    '''
+    RemoteStore that talks to a RemoteStoreServer (or anything speaking its protocol).
+    Keeps a pool of up to pool_size keep-alive connections so it can be shared
+    between threads, and sends keys in batches of at most REMOTE_BATCH_SIZE keys
+    and REMOTE_BATCH_BYTES bytes.
+    '''
+
+    def __init__(self, host, port, pool_size=4, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool = Queue.Queue()
+        for _ in xrange(pool_size):
+            self.pool.put(None)
+
+    def send(self, path, body, key=None, output=None):
+        '''
+        sends a POST request using a pooled connection and returns the response status
+        and body. body may be a string or an open file. If output is given, the body of
+        a successful response is copied into it instead of being returned.
+        '''
+        headers = {}
+        if key is not None:
+            headers['X-Cachelog-Key'] = urllib.quote(key)
+        connection = self.pool.get()
+        try:
+            if connection is None:
+                connection = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            connection.request('POST', path, body, headers)
+            response = connection.getresponse()
+            if output is not None and response.status == 200:
+                shutil.copyfileobj(response, output, TRANSFER_BLOCK_SIZE)
+                response_body = None
+            else:
+                response_body = response.read()
+        except (httplib.HTTPException, socket.error) as error:
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise IOError('remote store request failed: ' + str(error))
+        finally:
+            self.pool.put(connection)
+        return response.status, response_body
+
+    def request(self, path, payload):
+        '''sends a pickled payload to the server and returns the unpickled response'''
+        status, body = self.send(path, pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+        if status != 200:
+            raise IOError('remote store returned status ' + str(status))
+        return pickle.loads(body)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        blobs = {}
+        for start in xrange(0, len(keys), REMOTE_BATCH_SIZE):
+            blobs.update(self.request('/get', keys[start:start + REMOTE_BATCH_SIZE]))
+        return blobs
+
+    def put_many(self, items):
+        for batch in split_into_batches(items):
+            self.request('/put', batch)
+
+    def get_file(self, key, file_pointer):
+        status = self.send('/get_file', '', key, file_pointer)[0]
+        if status == 404:
+            return False
+        if status != 200:
+            raise IOError('remote store returned status ' + str(status))
+        return True
+
+    def put_file(self, key, file_pointer):
+        status = self.send('/put_file', file_pointer, key)[0]
+        if status != 200:
+            raise IOError('remote store returned status ' + str(status))
+
+    def put_newest(self, items):
+        keys = list(items)
+        for start in xrange(0, len(keys), REMOTE_BATCH_SIZE):
+            self.request('/put_newest', \
+                {key: items[key] for key in keys[start:start + REMOTE_BATCH_SIZE]})
+
+class RemoteStoreHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''handles batched get/put requests for a RemoteStoreServer'''
+
+    # HTTP/1.1 keeps connections alive so HTTPRemoteStore can reuse them.
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        '''
+        POST /get takes a list of keys, POST /put takes a dict of key/blob pairs
+        and POST /put_newest takes a dict of key/(timestamp, blob) pairs.
+        POST /get_file and /put_file stream a single blob whose key is in the
+        X-Cachelog-Key header.
+        '''
+        length = int(self.headers.getheader('content-length', 0))
+        if self.path in ['/get_file', '/put_file']:
+            key = urllib.unquote(self.headers.getheader('x-cachelog-key', ''))
+            if self.path == '/put_file':
+                self.server.put_blob_from_stream(key, self.rfile, length)
+                self.send_body('')
+            else:
+                self.rfile.read(length)
+                self.send_blob_file(key)
+            return
+
+        payload = pickle.loads(self.rfile.read(length))
+        if self.path == '/get':
+            response = self.server.get_blobs(payload)
+        elif self.path == '/put':
+            response = self.server.put_blobs(payload)
+        elif self.path == '/put_newest':
+            response = self.server.put_newest_blobs(payload)
+        else:
+            self.send_error(404)
+            return
+        self.send_body(pickle.dumps(response, pickle.HIGHEST_PROTOCOL))
+
+    def send_body(self, body, status=200):
+        '''sends a response that keeps the connection alive'''
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_blob_file(self, key):
+        '''streams the blob stored under key, or responds 404 if there is none'''
+        try:
+            file_pointer = open(self.server.get_blob_path(key), 'rb')
+        except IOError:
+            self.send_body('', 404)
+            return
+        try:
+            self.send_response(200)
+            self.send_header('Content-Length', str(os.fstat(file_pointer.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(file_pointer, self.wfile, TRANSFER_BLOCK_SIZE)
+        finally:
+            file_pointer.close()
+
+    def log_message(self, format, *args):
+        '''keeps the server quiet'''
+        pass
+
+class RemoteStoreServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+    small stand-in for a remote key/blob service that stores each blob as a file in
+    store_root. Meant for testing and small clusters; the protocol uses pickle, so
+    only run it on a trusted network.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, store_root, host='127.0.0.1', port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), RemoteStoreHandler)
+        self.store_root = store_root
+        self.newest_lock = threading.Lock()
+        touch_path('', store_root)
+
+    def get_blob_path(self, key):
+        '''gets the name of the file that holds the blob stored under key.
+        Keys are hashed so that file names have a fixed length.'''
+        return os.path.join(self.store_root, hashlib.sha1(key).hexdigest())
+
+    def get_blobs(self, keys):
+        '''returns a dict of the blobs stored under any of keys'''
+        blobs = {}
+        for key in keys:
+            try:
+                file_pointer = open(self.get_blob_path(key), 'rb')
+            except IOError:
+                continue
+            blobs[key] = file_pointer.read()
+            file_pointer.close()
+        return blobs
+
+    def replace_file(self, path, write):
+        '''calls write on a temporary file and then renames it into place
+        so readers never see a partial file.'''
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.store_root, suffix='.tmp')
+        try:
+            file_pointer = os.fdopen(file_descriptor, 'wb')
+            write(file_pointer)
+            file_pointer.close()
+            os.rename(temp_path, path)
+        except:
+            os.remove(temp_path)
+            raise
+
+    def write_file(self, path, data):
+        '''replaces the file at path with data.'''
+        self.replace_file(path, lambda file_pointer: file_pointer.write(data))
+
+    def put_blob_from_stream(self, key, source, length):
+        '''stores the next length bytes read from source under key.'''
+        def copy(file_pointer):
+            '''copies the blob in blocks'''
+            remaining = length
+            while remaining > 0:
+                block = source.read(min(remaining, TRANSFER_BLOCK_SIZE))
+                if not block:
+                    raise IOError('connection closed during upload')
+                file_pointer.write(block)
+                remaining -= len(block)
+        self.replace_file(self.get_blob_path(key), copy)
+
+    def put_blobs(self, items):
+        '''stores key/blob pairs.'''
+        for key in items:
+            self.write_file(self.get_blob_path(key), items[key])
+
+    def put_newest_blobs(self, items):
+        '''stores key/(timestamp, blob) pairs, skipping any key that already
+        holds a newer blob. Timestamps are kept in a file next to each blob.'''
+        with self.newest_lock:
+            for key in items:
+                timestamp, blob = items[key]
+                path = self.get_blob_path(key)
+                try:
+                    file_pointer = open(path + '.timestamp', 'rb')
+                    stored_timestamp = int(file_pointer.read())
+                    file_pointer.close()
+                except (IOError, ValueError):
+                    stored_timestamp = None
+                if stored_timestamp is not None and stored_timestamp > timestamp:
+                    continue
+                self.write_file(path, blob)
+                self.write_file(path + '.timestamp', str(timestamp))
+
+def start_remote_store_server(store_root, host='127.0.0.1', port=0):
+    '''
+    starts a RemoteStoreServer in a background thread and returns it.
+    With port=0 a free port is chosen; find it in server.server_address.
+    Call server.shutdown() to stop it.
+    '''
+    server = RemoteStoreServer(store_root, host, port)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
@@ -5,6 +5,8 @@ Tests for cachelog
 import pytest
 import cachelog
 import os
+import tarfile
+import time
 
 SIDE_EFFECT_CANARY = 0
 LOG_FUNC_CALLS = 0
@@ -185,3 +187,241 @@ def test_deleted_cachefile():
     func_to_delete(1)
     assert(len(cachelog.get_logged_calls(func_to_delete)) == 1)
     assert SIDE_EFFECT_CANARY == initial_canary + 2
+
+def test_remote_store(tmpdir):
+    server = cachelog.start_remote_store_server(str(tmpdir.join('remote')))
+    host, port = server.server_address
+    cachelog.set_remote_store(cachelog.HTTPRemoteStore(host, port))
+    first_root = str(tmpdir.join('first')) + '/'
+    second_root = str(tmpdir.join('second')) + '/'
+    try:
+        #keys longer than a file name can be stored
+        long_key = '/' + 'very long {key}: ' * 20
+        cachelog.DEFAULT_REMOTE_STORE.put(long_key, 'blob')
+        assert cachelog.DEFAULT_REMOTE_STORE.get(long_key) == 'blob'
+        assert not [f for f in os.listdir(str(tmpdir.join('remote'))) if f.endswith('.tmp')]
+
+        #older pointers don't replace newer ones
+        cachelog.DEFAULT_REMOTE_STORE.put_newest({'pointer': (2, 'newer')})
+        cachelog.DEFAULT_REMOTE_STORE.put_newest({'pointer': (1, 'older')})
+        assert cachelog.DEFAULT_REMOTE_STORE.get('pointer') == 'newer'
+
+        initial_canary = SIDE_EFFECT_CANARY
+        args = {'x': 4, 'y': 5}
+
+        #computed on the first machine and written through to the remote store
+        result = cachelog.cache_function(func_to_cache, args, cache_root=first_root)
+        assert result == 9
+        assert SIDE_EFFECT_CANARY == initial_canary + 1
+
+        #the second machine reads through the remote store instead of recomputing
+        result = cachelog.cache_function(func_to_cache, args, cache_root=second_root)
+        assert result == 9
+        assert SIDE_EFFECT_CANARY == initial_canary + 1
+
+        #and now has its own local copy
+        cachelog.set_remote_store(None)
+        result = cachelog.cache_function(func_to_cache, args, cache_root=second_root)
+        assert result == 9
+        assert SIDE_EFFECT_CANARY == initial_canary + 1
+        assert len(cachelog.get_logged_calls(func_to_cache, cache_root=second_root)) == 1
+
+        #results computed without a remote store can be pushed later
+        with pytest.raises(ValueError):
+            cachelog.push_scope(cache_root=second_root)
+        new_args = {'x': 6, 'y': 7}
+        result = cachelog.cache_function(func_to_cache, new_args, cache_root=second_root)
+        assert result == 13
+        assert SIDE_EFFECT_CANARY == initial_canary + 2
+        cachelog.set_remote_store(cachelog.HTTPRemoteStore(host, port))
+        cachelog.push_scope(cache_root=second_root)
+        result = cachelog.cache_function(func_to_cache, new_args, cache_root=first_root)
+        assert result == 13
+        assert SIDE_EFFECT_CANARY == initial_canary + 2
+
+        #corrupt remote blobs are treated as a miss
+        third_root = str(tmpdir.join('third')) + '/'
+        cache_file = cachelog.get_logged_calls(func_to_cache, cache_root=first_root)[0]['cache_file']
+        cachelog.DEFAULT_REMOTE_STORE.put(cachelog.get_remote_key(cache_file, ''), 'garbage')
+        result = cachelog.cache_function(func_to_cache, args, cache_root=third_root)
+        assert result == 9
+        assert SIDE_EFFECT_CANARY == initial_canary + 3
+
+        #finished streams are shared too
+        def gen_to_share(n):
+            global SIDE_EFFECT_CANARY
+            SIDE_EFFECT_CANARY += 1
+            for x in xrange(n):
+                yield x
+
+        result = list(cachelog.cache_stream(gen_to_share, {'n': 50}, cache_root=first_root, \
+            chunk_size=7))
+        result = list(cachelog.cache_stream(gen_to_share, {'n': 50}, cache_root=second_root))
+        assert result == range(50)
+        assert SIDE_EFFECT_CANARY == initial_canary + 4
+
+        #concurrent pulls of the same file both get a hit and index it once
+        class RacingRemoteStore(cachelog.HTTPRemoteStore):
+            '''pulls the same file again while a pull is in progress'''
+            racing = False
+            def get_file(self, key, file_pointer):
+                if not self.racing:
+                    self.racing = True
+                    assert cachelog.pull_from_remote_store(func_to_cache, args, '', fourth_root)
+                return cachelog.HTTPRemoteStore.get_file(self, key, file_pointer)
+
+        fourth_root = str(tmpdir.join('fourth')) + '/'
+        cachelog.set_remote_store(RacingRemoteStore(host, port))
+        result = cachelog.cache_function(func_to_cache, args, cache_root=fourth_root)
+        assert result == 9
+        assert SIDE_EFFECT_CANARY == initial_canary + 4
+        assert len(cachelog.get_logged_calls(func_to_cache, cache_root=fourth_root)) == 1
+        assert not [f for f in os.listdir(fourth_root) if f.endswith(cachelog.PARTIAL_SUFFIX)]
+    finally:
+        cachelog.set_remote_store(None)
+        server.shutdown()
+        server.server_close()
+
+def test_split_into_batches():
+    items = {str(x): 'b' * x for x in xrange(1, 200)}
+    batches = list(cachelog.split_into_batches(items))
+    assert sum([len(batch) for batch in batches]) == len(items)
+    for batch in batches:
+        assert len(batch) <= cachelog.REMOTE_BATCH_SIZE
+
+    blob = 'b' * (cachelog.REMOTE_BATCH_BYTES / 3)
+    items = {str(x): blob for x in xrange(4)}
+    batches = list(cachelog.split_into_batches(items))
+    assert [len(batch) for batch in batches] == [3, 1]
+
+def test_streaming():
+    def gen_to_stream(n):
+        global SIDE_EFFECT_CANARY
+        SIDE_EFFECT_CANARY += 1
+        for x in xrange(n):
+            yield x*x
+
+    func_to_stream = cachelog.streamify(gen_to_stream)
+    initial_canary = SIDE_EFFECT_CANARY
+
+    #interrupted runs should not be cached
+    stream = func_to_stream(10)
+    assert next(stream) == 0
+    assert next(stream) == 1
+    stream.close()
+    assert SIDE_EFFECT_CANARY == initial_canary + 1
+    assert len(cachelog.get_logged_calls(func_to_stream)) == 0
+    scope_path = os.path.join(cachelog.DEFAULT_CACHE_ROOT, cachelog.DEFAULT_SCOPE)
+    assert not [f for f in os.listdir(scope_path) if f.endswith(cachelog.PARTIAL_SUFFIX)]
+
+    result = list(func_to_stream(10))
+    assert result == [x*x for x in xrange(10)]
+    assert SIDE_EFFECT_CANARY == initial_canary + 2
+
+    #cache hits are lazy iterators and don't re-run the function
+    stream = func_to_stream(10)
+    assert not isinstance(stream, list)
+    assert list(stream) == result
+    assert SIDE_EFFECT_CANARY == initial_canary + 2
+
+    result = list(cachelog.cache_stream(gen_to_stream, {'n': 7}, chunk_size=3))
+    assert result == [x*x for x in xrange(7)]
+    assert list(cachelog.cache_stream(gen_to_stream, {'n': 7})) == result
+    assert SIDE_EFFECT_CANARY == initial_canary + 3
+
+    #filter_func and processor each get their own iterator over streamed results
+    processed_calls = cachelog.process_logged_function_calls(gen_to_stream, processor=list, \
+        filter_func=lambda results: sum(1 for _ in results) > 7)
+    assert processed_calls == [[x*x for x in xrange(10)]]
+
+def test_remove_stale_partial_files(tmpdir):
+    cache_root = str(tmpdir) + '/'
+    cachelog.touch_path('', cache_root)
+    stale_file = 'stale.cache' + cachelog.PARTIAL_SUFFIX
+    fresh_file = 'fresh.cache' + cachelog.PARTIAL_SUFFIX
+    for file_name in [stale_file, fresh_file]:
+        open(os.path.join(cache_root, file_name), 'w').close()
+    stale_time = time.time() - 2 * cachelog.STALE_PARTIAL_AGE
+    os.utime(os.path.join(cache_root, stale_file), (stale_time, stale_time))
+
+    removed_files = cachelog.remove_stale_partial_files(cache_root=cache_root)
+    assert removed_files == [stale_file]
+    assert sorted(os.listdir(cache_root)) == [fresh_file]
+
+    fresh_time = time.time() - 10
+    os.utime(os.path.join(cache_root, fresh_file), (fresh_time, fresh_time))
+    assert cachelog.remove_stale_partial_files(5, cache_root=cache_root) == [fresh_file]
+
+def test_export_import(tmpdir):
+    first_root = str(tmpdir.join('first')) + '/'
+    second_root = str(tmpdir.join('second')) + '/'
+    archive_path = str(tmpdir.join('scope.tar'))
+    initial_canary = SIDE_EFFECT_CANARY
+
+    cachelog.cache_function(func_to_cache, {'x': 1, 'y': 1}, cache_root=first_root)
+    cachelog.cache_function(func_to_cache, {'x': 2, 'y': 2}, cache_root=first_root)
+    cachelog.cache_function(func_to_cache, {'x': 3, 'y': 3}, cache_root=second_root)
+    cachelog.cache_function(func_to_cache, {'x': 4, 'y': 4}, cache_root=first_root)
+    assert SIDE_EFFECT_CANARY == initial_canary + 4
+    deleted_call = [logged_call for logged_call in \
+        cachelog.get_logged_calls(func_to_cache, cache_root=first_root) \
+        if logged_call['arguments'] == {'x': 4, 'y': 4}][0]
+    os.remove(os.path.join(first_root, deleted_call['cache_file']))
+
+    assert cachelog.warm_scope([func_to_cache], cache_root=first_root) > 0
+
+    cachelog.export_scope(archive_path, cache_root=first_root)
+    cachelog.import_scope(archive_path, cache_root=second_root)
+
+    #imported entries are cache hits and existing entries are kept
+    assert deleted_call['cache_key'] not in cachelog.copy_index('', second_root)
+    assert len(cachelog.get_logged_calls(func_to_cache, cache_root=second_root)) == 3
+    assert cachelog.cache_function(func_to_cache, {'x': 1, 'y': 1}, cache_root=second_root) == 2
+    assert cachelog.cache_function(func_to_cache, {'x': 3, 'y': 3}, cache_root=second_root) == 6
+    assert SIDE_EFFECT_CANARY == initial_canary + 4
+
+    #importing twice doesn't duplicate entries or rewrite existing files
+    imported_file = [logged_call['cache_file'] for logged_call in \
+        cachelog.get_logged_calls(func_to_cache, cache_root=second_root) \
+        if logged_call['arguments'] == {'x': 1, 'y': 1}][0]
+    os.utime(os.path.join(second_root, imported_file), (1, 1))
+    cachelog.import_scope(archive_path, cache_root=second_root)
+    assert len(cachelog.get_logged_calls(func_to_cache, cache_root=second_root)) == 3
+    assert os.path.getmtime(os.path.join(second_root, imported_file)) == 1
+
+    #archives without an index are rejected before anything is extracted
+    third_root = str(tmpdir.join('third')) + '/'
+    bad_archive_path = str(tmpdir.join('bad.tar'))
+    bad_archive = tarfile.open(bad_archive_path, 'w')
+    bad_archive.add(os.path.join(first_root, imported_file), arcname=imported_file)
+    bad_archive.close()
+    with pytest.raises(ValueError):
+        cachelog.import_scope(bad_archive_path, cache_root=third_root)
+    assert os.listdir(third_root) == []
+
+def test_merge_scopes(tmpdir):
+    cache_root = str(tmpdir) + '/'
+    initial_canary = SIDE_EFFECT_CANARY
+
+    cachelog.cache_function(func_to_cache, {'x': 1, 'y': 1}, scope='first', cache_root=cache_root)
+    cachelog.cache_function(func_to_cache, {'x': 2, 'y': 2}, scope='second', cache_root=cache_root)
+    cachelog.merge_scopes('first', 'second', cache_root)
+
+    assert len(cachelog.get_logged_calls(func_to_cache, 'second', cache_root)) == 2
+    assert len(cachelog.get_logged_calls(func_to_cache, 'first', cache_root)) == 1
+    assert cachelog.cache_function(func_to_cache, {'x': 1, 'y': 1}, \
+        scope='second', cache_root=cache_root) == 2
+    assert SIDE_EFFECT_CANARY == initial_canary + 2
+
+    #a newer source entry whose file was deleted doesn't replace a valid hit
+    cachelog.cache_function(func_to_cache, {'x': 2, 'y': 2}, scope='first', cache_root=cache_root)
+    assert SIDE_EFFECT_CANARY == initial_canary + 3
+    deleted_call = [logged_call for logged_call in \
+        cachelog.get_logged_calls(func_to_cache, 'first', cache_root) \
+        if logged_call['arguments'] == {'x': 2, 'y': 2}][0]
+    os.remove(os.path.join(cache_root, 'first', deleted_call['cache_file']))
+    cachelog.merge_scopes('first', 'second', cache_root)
+    assert cachelog.cache_function(func_to_cache, {'x': 2, 'y': 2}, \
+        scope='second', cache_root=cache_root) == 4
+    assert SIDE_EFFECT_CANARY == initial_canary + 3
+    assert len(cachelog.get_logged_calls(func_to_cache, 'second', cache_root)) == 2